@@ -1,5 +1,12 @@
+from functools import lru_cache
+import argparse
 import time
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 def fib(n):
     if n < 2:
@@ -7,7 +14,55 @@ def fib(n):
     return fib(n - 1) + fib(n - 2)
 
 
-start = time.time()
-print(fib(35))
-end = time.time()
-print(end - start)
+@lru_cache(maxsize=None)
+def fib_memo(n):
+    if n < 2:
+        return n
+    return fib_memo(n - 1) + fib_memo(n - 2)
+
+
+def fib_iter(n):
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+IMPLEMENTATIONS = {
+    'recursive': fib,
+    'memo': fib_memo,
+    'iterative': fib_iter,
+}
+
+# Numba is optional, it only adds a JIT-compiled version of the recursive fib.
+if njit is not None:
+    @njit(cache=True)
+    def fib_nb(n):
+        return n if n < 2 else fib_nb(n - 1) + fib_nb(n - 2)
+
+    IMPLEMENTATIONS['numba'] = fib_nb
+
+
+def main():
+    """
+    Times fib(35) with the selected implementations.
+    """
+    parser = argparse.ArgumentParser(description="Times fib(35) for comparison against the bytecode vm.")
+    parser.add_argument('--impl', default='iterative', choices=[*IMPLEMENTATIONS, 'all'],
+                        help='Implementation to time, the recursive one measures raw call overhead')
+    args = parser.parse_args()
+
+    impls = IMPLEMENTATIONS.values() if args.impl == 'all' else [IMPLEMENTATIONS[args.impl]]
+    if njit is not None and fib_nb in impls:
+        # Warm up the JIT so compilation isn't part of the timing.
+        fib_nb(1)
+
+    for impl in impls:
+        start = time.time()
+        print(f"{impl.__name__}: {impl(35)}")
+        end = time.time()
+        print(end - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,22 @@
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterator, Optional
 import os
+import shutil
 import subprocess
 
 # Local scripts
 from config import Config
 
 
+@lru_cache(maxsize=1)
 def project_root() -> Path:
     """
     Looks upward for a build root where a .git resides.
 
     This allows finding the build root from other directories, such as to when
-    scripts from inside the scripts/ directory.
+    scripts from inside the scripts/ directory.  The result is cached, since
+    it is looked up again for every sample program run.
     """
     current_dir: Path = Path(os.curdir).absolute()
     while not current_dir.joinpath(".git").exists():
@@ -27,59 +32,216 @@ def cmake_build_root(config: Config) -> str:
     return f"build-{config.name.lower()}"
 
 
-def build_bytecode_vm(config: Config) -> bool:
+def source_stamp() -> str:
+    """
+    Fingerprints the sources and CMake files which go into the build, to tell
+    whether a previous build is still up-to-date.
+    """
     root_dir: Path = project_root()
-    previous_dir = os.getcwd()
-    os.chdir(root_dir)
+    sources: list[Path] = [root_dir.joinpath("CMakeLists.txt")]
+    for source_dir in ("src", "tests"):
+        sources.extend(p for p in root_dir.joinpath(source_dir).rglob("*") if p.is_file())
+    return f"{len(sources)} {max(p.stat().st_mtime_ns for p in sources)}"
+
 
-    # Make the build directory if needed.
-    build_dir: str = cmake_build_root(config)
-    if not os.path.exists(build_dir):
-        os.mkdir(build_dir)
-    os.chdir(build_dir)
+def build_bytecode_vm(config: Config) -> bool:
+    # Make the build directory if needed.  Commands are run from it with cwd
+    # rather than changing the working directory, which is process-wide.
+    build_dir: Path = project_root().joinpath(cmake_build_root(config))
+    build_dir.mkdir(exist_ok=True)
+    cmake_cache: Path = build_dir.joinpath("CMakeCache.txt")
+
+    # Skip the build entirely if nothing has changed since the last successful
+    # one, and the VM it built is still there.
+    stamp: str = source_stamp()
+    stamp_file: Path = build_dir.joinpath(".last_build_stamp")
+    if (cmake_cache.exists() and vm_path(config).exists() and stamp_file.exists()
+            and stamp_file.read_text() == stamp):
+        return True
 
     # The build directory might exist, but CMake might not have been run yet.
-    if not os.path.exists("CMakeCache.txt"):
-        result: subprocess.CompletedProcess = subprocess.run(f"cmake -DCMAKE_BUILD_TYPE={config.name} ..".split())
+    if not cmake_cache.exists():
+        # Prefer Ninja when it is available, since it is faster at incremental rebuilds.
+        generator: list[str] = ["-G", "Ninja"] if shutil.which("ninja") else []
+
+        # Use ccache if it is available.  CMake only reads the launchers from
+        # the environment when generating, after which they're in the cache.
+        env = dict(os.environ)
+        if shutil.which("ccache"):
+            env["CMAKE_C_COMPILER_LAUNCHER"] = "ccache"
+            env["CMAKE_CXX_COMPILER_LAUNCHER"] = "ccache"
+
+        result: subprocess.CompletedProcess = subprocess.run(
+            ["cmake", *generator, f"-DCMAKE_BUILD_TYPE={config.name}", ".."], cwd=build_dir, env=env)
         if result.returncode != 0:
             print("Failed to generate CMake project.")
             return False
 
     # The true "build" step.
     # --config is only needed in multi-config generations, like Visual Studio
-    result = subprocess.run(f"cmake --build . -j32 --config={config.name}".split())
+    # An explicit job count is given when known, since not every build tool
+    # defaults to using all cores.
+    jobs: Optional[int] = os.cpu_count()
+    parallel: list[str] = ["--parallel", str(jobs)] if jobs else ["--parallel"]
+    result = subprocess.run(["cmake", "--build", ".", *parallel, "--config", config.name],
+                            cwd=build_dir)
     if result.returncode != 0:
         print("Building the VM failed.")
         return False
 
     # Verify the project unit tests pass.
-    result = subprocess.run(["ctest", "-C", config.name, "--build-and-test"])
+    result = subprocess.run(["ctest", "-C", config.name, "--build-and-test"], cwd=build_dir)
     if result.returncode != 0:
         print("Compiler and/or VM unit tests failed.")
         return False
 
-    os.chdir(previous_dir)
+    stamp_file.write_text(stamp)
     return True
 
 
 def vm_path(config: Config) -> Path:
-    exe_name: str = "cxxlox_vm_cli.exe"
-    return project_root().joinpath(cmake_build_root(config), "src", config.name, exe_name)
+    exe_name: str = "cxxlox_vm_cli.exe" if os.name == "nt" else "cxxlox_vm_cli"
+    src_dir: Path = project_root().joinpath(cmake_build_root(config), "src")
 
+    # Multi-config generators, like Visual Studio, put executables in a
+    # directory per configuration, but single-config ones like Ninja don't.
+    multi_config_path: Path = src_dir.joinpath(config.name, exe_name)
+    if multi_config_path.exists():
+        return multi_config_path
+    return src_dir.joinpath(exe_name)
 
-def run_program(program_name: Path, config: Config) -> str:
+
+def warm_vm(config: Config) -> None:
+    """
+    Pulls the VM executable into the OS page cache, so the first runs of it
+    don't need to load it from disk.
+    """
+    vm = vm_path(config)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            fd = os.open(vm, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        else:
+            vm.read_bytes()
+    except OSError:
+        # This is only an optimization, failing to run the VM is reported later.
+        pass
+
+
+def run_program_bytes(program_name: Path, config: Config) -> bytes:
+    """
+    Runs a program on the VM, returning its undecoded output.
+    """
     vm = vm_path(config)
     try:
-        return subprocess.check_output([vm, program_name]).decode('utf-8')
+        return subprocess.check_output([vm, program_name])
     except subprocess.CalledProcessError as cpe:
         print(f"Failed to run vm {vm} on {program_name}")
         print(cpe)
-        return ""
+        return b""
+    except FileNotFoundError as fnfe:
+        print(f"File not found to run vm {vm} on {program_name}")
+        print(fnfe)
+        return b""
+    except Exception as ex:
+        print(f"An unexpected error occurred while running vm {vm} on {program_name}")
+        print(ex)
+        return b""
+
+
+def run_program(program_name: Path, config: Config) -> str:
+    return run_program_bytes(program_name, config).decode('utf-8', errors='replace')
+
+
+class BatchVM:
+    """
+    A long-running VM process in batch mode, which runs programs one at a time
+    to avoid starting a new process for each of them.
+    """
+
+    RECORD_SEPARATOR = b"\x1e"
+
+    def __init__(self, config: Config):
+        self.vm = vm_path(config)
+        self.process = self._start()
+
+    def _start(self) -> subprocess.Popen:
+        return subprocess.Popen([self.vm, "--batch"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def run(self, program_name: Path) -> bytes:
+        """
+        Runs a program, returning its undecoded output, or nothing if the
+        program fails, the same as `run_program_bytes`.
+        """
+        try:
+            self.process.stdin.write(os.fsencode(program_name) + b"\0")
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            # The VM has already exited, which is handled when reading its output.
+            pass
+
+        # The program's output ends at a record separator, followed by its
+        # exit code on the rest of the line.
+        output = bytearray()
+        for line in iter(self.process.stdout.readline, b""):
+            program_output, separator, trailer = line.partition(self.RECORD_SEPARATOR)
+            output += program_output
+            if separator:
+                try:
+                    exit_code = int(trailer)
+                except ValueError:
+                    # The program printed a record separator itself, so the
+                    # rest of the VM's output can't be trusted.
+                    print(f"Unexpected output from vm {self.vm} on {program_name}")
+                    self._restart()
+                    return b""
+                if exit_code != 0:
+                    print(f"Failed to run vm {self.vm} on {program_name}, exit code {exit_code}")
+                    return b""
+                return bytes(output)
+
+        # The VM crashed, so replace it for the next programs.
+        print(f"Failed to run vm {self.vm} on {program_name}, exit code {self.process.wait()}")
+        self._restart()
+        return b""
+
+    def _restart(self) -> None:
+        self.process.kill()
+        self.close()
+        self.process = self._start()
+
+    def close(self) -> None:
+        self.process.stdout.close()
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            # The pipe is still closed, only flushing the unsent input failed.
+            pass
+        self.process.wait()
+
+
+def stream_program(program_name: Path, config: Config) -> Iterator[str]:
+    """
+    Runs a program on the VM, yielding its output a line at a time as it is
+    produced, without the trailing newline.
+    """
+    vm = vm_path(config)
+    try:
+        with subprocess.Popen([vm, program_name], stdout=subprocess.PIPE, encoding='utf-8', errors='replace',
+                              bufsize=1) as process:
+            for line in process.stdout:
+                yield line.rstrip('\n')
     except FileNotFoundError as fnfe:
         print(f"File not found to run vm {vm} on {program_name}")
         print(fnfe)
-        return ""
+        return
     except Exception as ex:
         print(f"An unexpected error occurred while running vm {vm} on {program_name}")
         print(ex)
-        return ""
+        return
+
+    if process.returncode != 0:
+        print(f"Failed to run vm {vm} on {program_name}, exit code {process.returncode}")
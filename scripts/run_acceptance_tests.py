@@ -1,42 +1,160 @@
-from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from itertools import zip_longest
+from pathlib import Path
+from queue import Queue
+from typing import Optional
 import os
+import pickle
 import sys
 
 from config import Config
-from project import build_bytecode_vm, project_root, run_program
+from project import BatchVM, build_bytecode_vm, cmake_build_root, project_root, warm_vm
 
+# Expected outputs by path, along with the (mtime, size) they were read at, so
+# unchanged files don't need to be read again.  This is saved between runs.
+expected_cache: dict[str, tuple[tuple[int, int], bytes]] = {}
 
-def main():
-    # Run all tests in release
-    if not build_bytecode_vm(Config.Release):
+
+def sample_files(samples_dir: Path) -> list[Path]:
+    """
+    Finds the sample programs in a directory, sorted to give a deterministic
+    test order.
+    """
+    with os.scandir(samples_dir) as entries:
+        return sorted(Path(entry.path) for entry in entries
+                      if entry.name.endswith('.lox') and entry.is_file(follow_symlinks=False))
+
+
+def expected_cache_path(config: Config) -> Path:
+    return project_root().joinpath(cmake_build_root(config), '.expected_cache.pkl')
+
+
+def load_expected_cache(config: Config) -> None:
+    # A missing or unreadable cache only means every file gets read.
+    try:
+        with expected_cache_path(config).open('rb') as cache_file:
+            cache = pickle.load(cache_file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, TypeError,
+            ValueError):
+        return
+
+    if not isinstance(cache, dict):
+        return
+    expected_cache.update((key, entry) for key, entry in cache.items()
+                          if isinstance(entry, tuple) and len(entry) == 2 and isinstance(entry[1], bytes))
+
+
+def save_expected_cache(config: Config, expected_files: list[Path]) -> None:
+    # Only keep the files from this run, so removed samples drop out.
+    keys = {str(expected_file) for expected_file in expected_files}
+    cache = {key: entry for key, entry in expected_cache.items() if key in keys}
+    try:
+        with expected_cache_path(config).open('wb') as cache_file:
+            pickle.dump(cache, cache_file)
+    except OSError:
+        # The cache is only an optimization, so failing to save it is fine.
+        pass
+
+
+def read_expected(expected_file: Path) -> Optional[bytes]:
+    """
+    Reads an expected output file with normalized line endings, or returns None
+    if it doesn't exist.
+    """
+    try:
+        stat = expected_file.stat()
+    except FileNotFoundError:
+        return None
+
+    key = str(expected_file)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = expected_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    expected_output = expected_file.read_bytes().replace(b'\r\n', b'\n')
+    expected_cache[key] = (version, expected_output)
+    return expected_output
+
+
+def run_one(file: Path, expected_output: Optional[bytes], vms: Queue):
+    """
+    Runs a single sample program on one of the available VMs, and compares it
+    against its expected output.
+
+    Returns (file, passed, merged lines), where passed is None if the sample
+    has no expected output.
+    """
+    if expected_output is None:
+        return file, None, []
+
+    vm: BatchVM = vms.get()
+    try:
+        real_output = vm.run(file).replace(b'\r\n', b'\n')
+    finally:
+        vms.put(vm)
+
+    # Most samples pass, so check the whole output at once, and only decode
+    # and compare line-by-line to build the report when that fails.
+    if real_output == expected_output:
+        return file, True, []
+
+    real_lines = real_output.decode('utf-8', errors='replace').splitlines()
+    expected_lines = expected_output.decode('utf-8', errors='replace').splitlines()
+    merged = list(zip_longest(real_lines, expected_lines, fillvalue=""))
+    passed = all(left == right for left, right in merged)
+    return file, passed, merged
+
+
+def run_suite(config: Config = Config.Release, workers: Optional[int] = None) -> bool:
+    """
+    Builds the VM and runs every sample program against its expected output,
+    printing a report.
+
+    Returns whether all samples passed.  Samples are run on up to `workers`
+    VMs, defaulting to one per core.
+    """
+    if not build_bytecode_vm(config):
         print("Build step failed.")
-        sys.exit(1)
+        return False
 
     fails = 0
     passes = 0
     omits = 0
 
-    samples_dir = os.path.join(project_root(), 'samples')
-    for file in glob(os.path.join(samples_dir, '*.lox')):
-        expected_file = file.replace('.lox', '.expected')
-        if not os.path.exists(expected_file):
-            print(f"[OMIT] {file} ... no '.expected' output file")
-            omits += 1
-            continue
-
-        with open(expected_file, 'r') as expected_file:
-            expected_output = expected_file.read()
-        real_output = run_program(file, Config.Release)
+    files = sample_files(project_root().joinpath('samples'))
+    expected_files = [file.with_suffix('.expected') for file in files]
+    load_expected_cache(config)
+    expected_outputs = [read_expected(expected_file) for expected_file in expected_files]
+    warm_vm(config)
 
-        if real_output is None:
-            real_output = ""
-        real_lines = real_output.splitlines()
-        expected_lines = expected_output.splitlines()
-        merged = list(zip_longest(real_lines, expected_lines, fillvalue=""))
-        passed = all([left == right for left, right in merged])
+    # Samples run on a pool of long-lived VM processes, so threads are enough
+    # to run them concurrently.  There's no more VMs than samples to run, and
+    # samples without expected output don't need one.  Results come back in
+    # the same order as the files.
+    runnable: int = sum(1 for expected_output in expected_outputs if expected_output is not None)
+    workers = min(workers or os.cpu_count() or 1, runnable)
+    vms: Queue = Queue()
+    try:
+        for _ in range(workers):
+            vms.put(BatchVM(config))
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            results = list(executor.map(partial(run_one, vms=vms), files, expected_outputs))
+    except FileNotFoundError as fnfe:
+        print("VM not found to run samples")
+        print(fnfe)
+        return False
+    finally:
+        while not vms.empty():
+            vms.get().close()
+    save_expected_cache(config, expected_files)
 
-        if passed:
+    for file, passed, merged in results:
+        if passed is None:
+            print(f"[OMIT] {file} ... no '.expected' output file")
+            omits += 1
+        elif passed:
             print(f'[PASS] {file}')
             passes += 1
         else:
@@ -53,7 +171,12 @@ def main():
     print(f"Omits:  {omits}")
     print(f"Total:  {passes + fails + omits}")
 
-    if fails > 0:
+    return fails == 0
+
+
+def main():
+    # Run all tests in release
+    if not run_suite(Config.Release):
         sys.exit(1)
 
 
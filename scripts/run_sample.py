@@ -3,7 +3,7 @@ from pathlib import Path
 import sys
 
 from config import Config
-from project import build_bytecode_vm, run_program
+from project import build_bytecode_vm, stream_program
 
 
 def main():
@@ -23,7 +23,8 @@ def main():
         print("Failed to build the virtual machine.")
         sys.exit(1)
 
-    print(run_program(program_name, config))
+    for line in stream_program(program_name, config):
+        print(line)
 
 
 if __name__ == "__main__":
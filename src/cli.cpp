@@ -8,6 +8,7 @@
 #include <iostream>
 #include <iterator>
 #include <string>
+#include <string_view>
 
 namespace cxxlox {
 
@@ -53,23 +54,43 @@ void repl()
 	return true;
 }
 
-void runFile(const char* fileName)
+ExitCode interpretFile(const char* fileName)
 {
 	std::string source;
 	if (!readFile(fileName, source)) {
 		std::cerr << "Unable to open file '" << fileName << "'\n";
-		exit(ExitCodeIOError);
+		return ExitCodeIOError;
 	}
 
 	const InterpretResult result = interpret(source);
+	VM::instance().reset();
+
 	if (result == InterpretResult::RuntimeError) {
-		exit(ExitCodeInternalSoftwareError);
+		return ExitCodeInternalSoftwareError;
 	}
 	if (result == InterpretResult::CompileError) {
-		exit(ExitCodeDataFormatError);
+		return ExitCodeDataFormatError;
 	}
+	return ExitCodeOk;
+}
 
-	VM::instance().reset();
+void runFile(const char* fileName)
+{
+	const ExitCode exitCode = interpretFile(fileName);
+	if (exitCode != ExitCodeOk) {
+		exit(exitCode);
+	}
+}
+
+void runBatch(std::istream& in)
+{
+	constexpr char kRecordSeparator = '\x1e';
+
+	std::string fileName;
+	while (std::getline(in, fileName, '\0')) {
+		const ExitCode exitCode = interpretFile(fileName.c_str());
+		std::cout << kRecordSeparator << int(exitCode) << std::endl;
+	}
 }
 
 int runMain(int argc, char** argv)
@@ -77,11 +98,13 @@ int runMain(int argc, char** argv)
 	// Running as a REPL, since the first arg is this program's name.
 	if (argc == 1) {
 		repl();
+	} else if (argc == 2 && std::string_view(argv[1]) == "--batch") {
+		runBatch(std::cin);
 	} else if (argc == 2) {
 		// Running a file.
 		runFile(argv[1]);
 	} else {
-		std::cout << "Usage: cxxlox [filename]\n";
+		std::cout << "Usage: cxxlox [--batch | filename]\n";
 		return ExitCodeBadUsage;
 	}
 
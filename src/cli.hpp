@@ -1,5 +1,7 @@
 #pragma once
 
+#include <iosfwd>
+
 namespace cxxlox {
 
 // Linux style exit codes.
@@ -13,6 +15,18 @@ enum ExitCode
 	ExitCodeIOError = 74,
 };
 
+// Interprets a file, leaving the VM ready to run another one.  Returns the exit
+// code running the file on its own would give.
+[[nodiscard]] ExitCode interpretFile(const char* fileName);
+
+// Runs many files in one process, to avoid the startup cost of a process per
+// file when running lots of small programs, such as for tests.
+//
+// Null-terminated file names are read from `in`.  The output of each file is
+// followed by a record separator and the exit code which running it on its
+// own would have given, on a line of its own.
+void runBatch(std::istream& in);
+
 int runMain(int argc, char** argv);
 
 } // namespace cxxlox
@@ -0,0 +1,92 @@
+#include <gtest/gtest.h>
+
+#include "test_helpers.hpp"
+#include <cli.hpp>
+
+#include <filesystem>
+#include <fstream>
+#include <iostream>
+#include <random>
+#include <sstream>
+#include <string>
+#include <vector>
+
+using cxxlox::ExitCode;
+using cxxlox::interpretFile;
+using cxxlox::runBatch;
+
+class CliTest : public cxxlox::LoxTest
+{
+protected:
+	// Writes a Lox program to a temporary file, returning its path.  Names are
+	// unique so concurrent test runs don't overwrite each other's files.
+	std::string writeProgram(const std::string& name, const std::string& source)
+	{
+		const std::string testName = testing::UnitTest::GetInstance()->current_test_info()->name();
+		const std::string suffix = std::to_string(std::random_device {}());
+		const std::filesystem::path path =
+			std::filesystem::temp_directory_path() / ("cxxlox_" + testName + "_" + name + "_" + suffix + ".lox");
+		std::ofstream file(path);
+		file << source;
+		files.push_back(path);
+		return path.string();
+	}
+
+	void TearDown() override
+	{
+		for (const auto& path : files) {
+			std::filesystem::remove(path);
+		}
+	}
+
+	std::vector<std::filesystem::path> files;
+};
+
+TEST_F(CliTest, InterpretFileAfterRuntimeError)
+{
+	const std::string failing = writeProgram("runtime_error", "var leaked = 1;\nleaked();\n");
+	const std::string reading = writeProgram("read_leaked", "print leaked;\n");
+	const std::string good = writeProgram("good", "var x = 1;\nprint x;\n");
+
+	EXPECT_EQ(interpretFile(failing.c_str()), ExitCode::ExitCodeInternalSoftwareError);
+
+	// Globals from the failed run must not carry over into the next one.
+	EXPECT_EQ(interpretFile(reading.c_str()), ExitCode::ExitCodeInternalSoftwareError);
+	EXPECT_EQ(interpretFile(good.c_str()), ExitCode::ExitCodeOk);
+}
+
+TEST_F(CliTest, InterpretFileAfterCompileError)
+{
+	const std::string failing = writeProgram("compile_error", "var = ;\n");
+	const std::string good = writeProgram("after_compile_error", "var x = 1;\nprint x;\n");
+
+	EXPECT_EQ(interpretFile(failing.c_str()), ExitCode::ExitCodeDataFormatError);
+	EXPECT_EQ(interpretFile(good.c_str()), ExitCode::ExitCodeOk);
+}
+
+TEST_F(CliTest, InterpretMissingFile)
+{
+	EXPECT_EQ(interpretFile("this_file_does_not_exist.lox"), ExitCode::ExitCodeIOError);
+}
+
+TEST_F(CliTest, RunBatch)
+{
+	const std::string first = writeProgram("first", "print 1;\n");
+	const std::string compileError = writeProgram("compile_error", "var = ;\n");
+	const std::string second = writeProgram("second", "print 2;\n");
+
+	std::string names;
+	for (const std::string& name : {first, compileError, std::string("this_file_does_not_exist.lox"), second}) {
+		names += name;
+		names += '\0';
+	}
+	std::istringstream in(names);
+
+	// Program output goes directly to std::cout, so capture it there.
+	std::ostringstream out;
+	std::streambuf* previous = std::cout.rdbuf(out.rdbuf());
+	runBatch(in);
+	std::cout.rdbuf(previous);
+
+	EXPECT_EQ(out.str(), "1\n\x1e" "0\n\x1e" "65\n\x1e" "74\n2\n\x1e" "0\n");
+}